@@ -1,71 +1,289 @@
+import argparse
 import cv2
+import json
+import os
+import socket
+import sys
 import threading
 import numpy as np
 import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+import camera  # noqa: E402  shared capture supervisor
+
+TILE_SIZE = (640, 480)          # (width, height) of one camera in the mosaic
+STATUS_BAR_HEIGHT = 40
+PREVIEW_MAX_FPS = 15
+TELEOP_STATUS_PORT = 5560       # must match teleop.STATUS_ADDR
+MJPEG_PORT = 8080
+MJPEG_BOUNDARY = 'frame'
 
 class CameraStream:
     def __init__(self, stream_url, name="Camera"):
         self.stream_url = stream_url
         self.name = name
-        self.cap = None
         self.frame = None
-        self.running = False
+        self.frame_id = 0 # Bumped on every new frame so consumers can skip unchanged ones
+        self.stop_event = threading.Event()
+        self.supervisor = camera.CaptureSupervisor(stream_url, name, self.stop_event)
         self.thread = None
-        self.reconnect_attempts = 0
-        self.max_reconnect_attempts = 5
-        self.reconnect_delay = 5 # seconds
 
 
     def start(self):
-        self.cap = cv2.VideoCapture(self.stream_url)
-        if not self.cap.isOpened():
-            print(f"Error: Could not open stream for {self.name}. Retrying...")
-            self.reconnect_attempts += 1
-            if self.reconnect_attempts <= self.max_reconnect_attempts:
-                time.sleep(self.reconnect_delay)
-                self.start() # Recursive call to retry
-            else:
-                print(f"Failed to open stream for {self.name} after {self.max_reconnect_attempts} attempts.")
-                self.running = False
-                return
-        else:
-            self.running = True
-            self.thread = threading.Thread(target=self._update, args=())
-            self.thread.daemon = True # Thread will close when main program exits
-            self.thread.start()
-            print(f"Successfully started stream for {self.name}.")
-
-    def _update(self):
-        while self.running:
-            ret, frame = self.cap.read()
-            if not ret:
-                print(f"Warning: Lost connection to {self.name}. Attempting to reconnect...")
-                self.reconnect_attempts = 0
-                self.stop()
-                self.start() # Attempt to restart the stream
-                if not self.running: # If restart failed after max attempts
-                    break
-            else:
-                self.frame = frame
-                self.reconnect_attempts = 0 # Reset attempts on successful read
-            time.sleep(0.01) # Small delay to prevent busy-waiting
+        # Connecting happens on the worker thread, start() never blocks
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.supervisor.run, args=(self._on_frame,))
+        self.thread.daemon = True # Thread will close when main program exits
+        self.thread.start()
+
+    def _on_frame(self, frame):
+        self.frame = frame
+        self.frame_id += 1
 
     def read(self):
         return self.frame
 
     def stop(self):
-        self.running = False
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=camera.STOP_DEADLINE) # Reads time out well within this
         if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=1) # Wait for thread to finish
-        if self.cap and self.cap.isOpened():
-            self.cap.release()
+            self.supervisor.freeze('abandoned')
+            print(f"Stream for {self.name} did not stop in time, abandoned.")
+        else:
+            self.supervisor.freeze('stopped')
             print(f"Stream for {self.name} stopped.")
 
+    @property
+    def state(self):
+        return self.supervisor.state
+
+    @property
+    def reconnects(self):
+        return self.supervisor.reconnects
+
     def is_running(self):
-        return self.running and self.cap and self.cap.isOpened()
+        return self.state == 'live'
+
+    def health(self):
+        return {'name': self.name, **self.supervisor.health(), 'frames': self.frame_id}
+
+class TeleopStatusListener:
+    """
+    Receives the status datagrams ControllerTeleop sends every tick and keeps
+    the latest one. Never blocks, poll() just drains whatever has arrived.
+    Missing fields fall back to defaults, datagrams that are not a JSON object
+    of numbers are ignored.
+    """
+    FIELDS = {'stage': 0, 'velocity': 0.0, 'tick': 0, 'overruns': 0,
+              'recording': False, 'lost': 0, 'reconnects': 0}
+
+    def __init__(self, port=TELEOP_STATUS_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', port))
+        self.sock.setblocking(False)
+        self.status = None
+
+    def poll(self):
+        while True:
+            try:
+                data = self.sock.recv(4096)
+            except BlockingIOError:
+                return self.status
+            status = self._parse(data)
+            if status is not None:
+                self.status = status
+
+    def _parse(self, data):
+        try:
+            status = json.loads(data)
+            if not isinstance(status, dict):
+                return None
+            return {key: type(default)(status.get(key, default)) for key, default in self.FIELDS.items()}
+        except (ValueError, TypeError):
+            return None
+
+    def close(self):
+        self.sock.close()
+
+
+class PreviewCompositor:
+    """
+    Multi-camera mosaic drawn into one preallocated canvas.
+
+    Each camera owns a fixed tile, which is only rewritten when that camera
+    delivers a new frame. A status bar under the tiles carries the teleop
+    telemetry and, per camera, reconnects and frames the preview skipped
+    because of its own frame rate cap (not lost from the recording).
+    """
+    def __init__(self, cameras, tile_size=TILE_SIZE, cols=2, bar_height=STATUS_BAR_HEIGHT):
+        self.cameras = cameras
+        self.tile_w, self.tile_h = tile_size
+        self.cols = min(cols, len(cameras))
+        rows = (len(cameras) + self.cols - 1) // self.cols
+
+        self.canvas = np.zeros((rows * self.tile_h + bar_height, self.cols * self.tile_w, 3),
+                               dtype=np.uint8)
+        self.tiles = []
+        for i in range(len(cameras)):
+            r, c = divmod(i, self.cols)
+            self.tiles.append(self.canvas[r * self.tile_h:(r + 1) * self.tile_h,
+                                          c * self.tile_w:(c + 1) * self.tile_w])
+        self.bar = self.canvas[rows * self.tile_h:]
+
+        self.last_frame_ids = [0] * len(cameras)
+        self.tile_states = [None] * len(cameras)
+        self.skipped = [0] * len(cameras)
+        self.last_status_text = None
+
+    def _placeholder(self, i, text):
+        if self.tile_states[i] == text:
+            return False
+        tile = self.tiles[i]
+        tile[:] = 0
+        cv2.putText(tile, f"{self.cameras[i].name} - {text}", (50, self.tile_h // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
+        self.tile_states[i] = text
+        return True
+
+    def _update_tile(self, i):
+        cam = self.cameras[i]
+        if not cam.is_running():
+            return self._placeholder(i, cam.state.capitalize())
+
+        frame_id = cam.frame_id
+        frame = cam.read()
+        if frame is None:
+            return self._placeholder(i, "No Signal")
+        if frame_id == self.last_frame_ids[i]:
+            return False
+
+        # Frames the camera produced since the last render were never shown
+        if self.last_frame_ids[i]:
+            self.skipped[i] += max(0, frame_id - self.last_frame_ids[i] - 1)
+        self.last_frame_ids[i] = frame_id
+
+        tile = self.tiles[i]
+        cv2.resize(frame, (self.tile_w, self.tile_h), dst=tile, interpolation=cv2.INTER_AREA)
+        cv2.putText(tile, cam.name, (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
+        self.tile_states[i] = 'live'
+        return True
+
+    def _status_text(self, status):
+        # Rec figures come from the recorder's streams, Preview ones from this process' own
+        cams = " ".join(f"C{i + 1} rc {cam.reconnects} skip {skipped}"
+                        for i, (cam, skipped) in enumerate(zip(self.cameras, self.skipped)))
+        if status is None:
+            return f"Teleop: no status | Preview {cams}"
+        rec = "ON" if status['recording'] else "off"
+        return (f"Stage {status['stage']} | Vel {status['velocity']:.4f} | "
+                f"Tick {status['tick']:6d} | Overruns {status['overruns']} | "
+                f"Rec {rec} lost {status['lost']} fr rc {status['reconnects']} | Preview {cams}")
+
+    def update(self, status=None):
+        """
+        Refreshes changed tiles and the status bar, returns True if anything
+        on the canvas changed.
+        """
+        changed = False
+        for i in range(len(self.cameras)):
+            changed |= self._update_tile(i)
+
+        text = self._status_text(status)
+        if text != self.last_status_text:
+            self.bar[:] = 0
+            cv2.putText(self.bar, text, (10, self.bar.shape[0] - 12),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+            self.last_status_text = text
+            changed = True
+        return changed
+
+
+class MJPEGServer:
+    """
+    Serves the latest mosaic as multipart MJPEG on http://127.0.0.1:<port>/.
+    Frames are only JPEG-encoded while at least one client is connected.
+    """
+    def __init__(self, port=MJPEG_PORT, quality=80):
+        self.quality = quality
+        self.jpeg = None
+        self.jpeg_id = 0
+        self.clients = 0
+        self.needs_frame = False
+        self.cond = threading.Condition()
+        self.running = True
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                with server.cond:
+                    server.clients += 1
+                    server.needs_frame = True
+                last_id = 0
+                try:
+                    while server.running:
+                        with server.cond:
+                            server.cond.wait_for(
+                                lambda: server.jpeg_id != last_id or not server.running, timeout=1.0)
+                            if server.jpeg_id == last_id:
+                                continue
+                            jpeg, last_id = server.jpeg, server.jpeg_id
+                        self.wfile.write(f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server.cond:
+                        server.clients -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"MJPEG preview at http://127.0.0.1:{port}/")
+
+    def publish(self, canvas, changed=True):
+        # New clients get the current canvas even if nothing changed since
+        if not self.clients or not (changed or self.needs_frame):
+            return
+        self.needs_frame = False
+        ok, buf = cv2.imencode('.jpg', canvas, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self.cond:
+            self.jpeg = buf.tobytes()
+            self.jpeg_id += 1
+            self.cond.notify_all()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
 
 def main():
-    
+    parser = argparse.ArgumentParser(description="Multi-camera live preview.")
+    parser.add_argument('--headless', action='store_true',
+                        help="serve the mosaic as MJPEG instead of opening a window")
+    parser.add_argument('--port', type=int, default=MJPEG_PORT)
+    parser.add_argument('--max-fps', type=float, default=PREVIEW_MAX_FPS)
+    args = parser.parse_args()
+
     CAM_CRED = 'root:admin'
     CAM_IPS = [
         '192.168.86.37',
@@ -79,72 +297,33 @@ def main():
         cam.start()
         camera_streams.append(cam)
 
-    time.sleep(2)
+    if not camera_streams:
+        print("No camera streams configured. Exiting.")
+        return
+
+    compositor = PreviewCompositor(camera_streams)
+    status_listener = TeleopStatusListener()
+    mjpeg_server = MJPEGServer(args.port) if args.headless else None
+    frame_period = 1.0 / args.max_fps
 
     try:
         while True:
-            frames_to_display = []
-            for cam in camera_streams:
-                if cam.is_running():
-                    frame = cam.read()
-                    if frame is not None:
-                        # Resize frame for consistent display, e.g., to 640x480
-                        frame_resized = cv2.resize(frame, (640, 480))
-                        # Add camera name to the frame for identification
-                        cv2.putText(frame_resized, cam.name, (10, 30),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                        frames_to_display.append(frame_resized)
-                    else:
-                        # If a camera is running but hasn't provided a frame yet,
-                        # or frame is None, you might want to display a placeholder.
-                        placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
-                        cv2.putText(placeholder, f"{cam.name} - No Signal", (50, 240),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
-                        frames_to_display.append(placeholder)
-                else:
-                    # If a camera failed to start or stopped, display an error placeholder
-                    placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
-                    cv2.putText(placeholder, f"{cam.name} - Disconnected", (50, 240),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
-                    frames_to_display.append(placeholder)
-
-
-            if not frames_to_display:
-                print("No active camera streams to display. Exiting.")
-                break
-
-
-            if len(frames_to_display) == 1:
-                combined_frame = frames_to_display[0]
-            elif len(frames_to_display) == 2:
-                combined_frame = np.hstack(frames_to_display)
+            t = time.time()
+
+            changed = compositor.update(status_listener.poll())
+            if mjpeg_server:
+                mjpeg_server.publish(compositor.canvas, changed)
+            elif changed:
+                cv2.imshow('Multi-Camera Live View', compositor.canvas)
+
+            # Sleep out the rest of the frame instead of spinning on waitKey(1)
+            wait = max(0.001, frame_period - (time.time() - t))
+            if mjpeg_server:
+                time.sleep(wait)
             else:
-                cols = 2
-                rows = (len(frames_to_display) + cols - 1) // cols
-                
-                # Pad frames if not a perfect fit for grid
-                while len(frames_to_display) % cols != 0:
-                    frames_to_display.append(np.zeros((480, 640, 3), dtype=np.uint8))
-                    
-                rows_of_frames = []
-                for i in range(rows):
-                    start_idx = i * cols
-                    end_idx = start_idx + cols
-                    row_frames = frames_to_display[start_idx:end_idx]
-                    if row_frames:
-                        rows_of_frames.append(np.hstack(row_frames))
-                
-                if rows_of_frames:
-                    combined_frame = np.vstack(rows_of_frames)
-                else:
-                    combined_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-
-
-            cv2.imshow('Multi-Camera Live View', combined_frame)
-
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
+                key = cv2.waitKey(int(wait * 1000) or 1) & 0xFF
+                if key == ord('q'):
+                    break
 
     except KeyboardInterrupt:
         print("Program interrupted by user.")
@@ -152,7 +331,11 @@ def main():
         # Release all camera streams and close windows
         for cam in camera_streams:
             cam.stop()
-        cv2.destroyAllWindows()
+        status_listener.close()
+        if mjpeg_server:
+            mjpeg_server.stop()
+        else:
+            cv2.destroyAllWindows()
         print("All streams released and windows closed.")
 
 if __name__ == '__main__':
@@ -1,13 +1,118 @@
 import cv2
+import numpy as np
 import os
 import threading
 import time
 from pathlib import Path
 
+RECONNECT_BACKOFF_INITIAL = 0.5  # seconds, doubled after every failed attempt
+RECONNECT_BACKOFF_MAX = 8.0      # seconds
+OPEN_TIMEOUT_MS = 3000           # bounds how long a dead RTSP source can block open/read
+READ_TIMEOUT_MS = 1000
+STOP_DEADLINE = 3.0              # seconds a session gets to finalize all its writers
+
+
+def open_capture(cam_src):
+    if isinstance(cam_src, str) and cam_src.startswith('rtsp://'):
+        return cv2.VideoCapture(cam_src, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS,
+        ])
+    return cv2.VideoCapture(cam_src)
+
+
+class CaptureSupervisor:
+    """
+    Keeps a capture open for as long as stop_event is clear.
+
+    run() blocks the thread it is called on: it opens the source, hands every
+    frame to on_frame and treats open failures, failed reads and exceptions
+    alike as an outage, reconnecting with exponential backoff. on_frame may
+    return False to end the loop.
+    """
+    def __init__(self, cam_src, name, stop_event):
+        self.cam_src = cam_src
+        self.name = name
+        self.stop_event = stop_event
+
+        self.lock = threading.Lock()
+        self.state = 'connecting'  # 'connecting', 'live', 'reconnecting', then 'stopped'/'abandoned'
+        self.frozen = False
+        self.reconnect_attempts = 0
+        self.reconnects = 0
+
+    def _set_state(self, state):
+        with self.lock:
+            if not self.frozen:
+                self.state = state
+
+    def freeze(self, state):
+        # Final state, a worker that is still running can no longer change it
+        with self.lock:
+            self.frozen = True
+            self.state = state
+
+    def run(self, on_frame):
+        cap = None
+        backoff = RECONNECT_BACKOFF_INITIAL
+        connected_once = False
+
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    if cap is None:
+                        cap = open_capture(self.cam_src)
+                        if not cap.isOpened():
+                            raise IOError("Failed to open source")
+                        if connected_once:
+                            self.reconnects += 1
+                        connected_once = True
+                        backoff = RECONNECT_BACKOFF_INITIAL
+                        self._set_state('live')
+                        print(f"[{self.name}] Connected.")
+
+                    ret, frame = cap.read()
+                    if not ret:
+                        raise IOError("Failed to read frame")
+                    if on_frame(frame) is False:
+                        return
+                    continue
+                except Exception as e:
+                    reason = e
+
+                if cap is not None:
+                    cap.release()
+                    cap = None
+                self.reconnect_attempts += 1
+                self._set_state('reconnecting' if connected_once else 'connecting')
+                print(f"[{self.name}] {reason}, retrying in {backoff:.1f}s.")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def health(self):
+        return {
+            'state': self.state,
+            'reconnect_attempts': self.reconnect_attempts,
+            'reconnects': self.reconnects,
+        }
+
 
 class CameraThread(threading.Thread):
+    """
+    Records one camera into <output_path>/<cam_id>.mp4.
+
+    Connecting and reconnecting are left to a CaptureSupervisor on this
+    thread, so neither construction nor start() blocks the caller. Whenever
+    the video falls behind wall-clock time since the thread started, e.g.
+    while the source is down, it is padded with the last frame (black before
+    the first one). Padding before the first frame is connect time and counted
+    in frames_startup, later padding is lost footage, see lost_frames().
+    """
     def __init__(self, cam_id, cam_src, output_path, target_fps, target_resolution):
-        super().__init__()
+        super().__init__(daemon=True)
         
         self.cam_id = cam_id
         self.cam_src = cam_src
@@ -15,51 +120,125 @@ class CameraThread(threading.Thread):
         self.fps = target_fps
         self.resolution = target_resolution  # (width, height)
 
-        self.running = threading.Event()
+        self.stop_event = threading.Event()
+        self.stop_time = None
+        self.finalized = threading.Event()
+        self.lock = threading.RLock()  # guards writer against a forced finalize(), which pads under it
+        self.supervisor = CaptureSupervisor(cam_src, f"Camera {cam_id}", self.stop_event)
 
-        self.cap = None
         self.writer = None
+        self.t_start = None
+        self.last_frame = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        self.frames_written = 0
+        self.frames_padded = 0   # after the first frame, i.e. outages
+        self.frames_startup = 0  # before the first frame, while connecting
 
         print(f"[Camera {self.cam_id}] Initializing camera thread.")
-        self.cap = cv2.VideoCapture(self.cam_src)
 
-        if not self.cap.isOpened():
-            print(f"[Camera {self.cam_id}] Failed to open source: {self.cam_src}")
-            
 
+    def run(self):
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out_file = os.path.join(self.output_path, f"{self.cam_id}.mp4")
-        self.writer = cv2.VideoWriter(out_file, fourcc, self.fps, self.resolution)
-
+        with self.lock:
+            if self.finalized.is_set():
+                return
+            self.writer = cv2.VideoWriter(out_file, fourcc, self.fps, self.resolution)
+            self.t_start = time.time()
         print(f"[Camera {self.cam_id}] Recording started.")
-        self.running.set()
-
 
-    def run(self):
         try:
-            while self.running.is_set():
-                ret, frame = self.cap.read()
-
-                if not ret:
-                    print(f"[Camera {self.cam_id}] Failed to read frame.")
-                    break
-
-                resized = cv2.resize(frame, self.resolution)
-                self.writer.write(resized)
-        except Exception as e:
-            print(f"[Camera {self.cam_id}] Exception occurred: {e}")
+            self.supervisor.run(self._on_frame)
         finally:
-            self.cleanup()
-            print(f"[Camera {self.cam_id}] Recording stopped and saved.")
+            self.finalize()
+            print(f"[Camera {self.cam_id}] Recording stopped and saved ({self.frames_written} frames, "
+                  f"{self.frames_startup} startup, {self.frames_padded} lost, "
+                  f"{self.supervisor.reconnects} reconnects).")
+
+    def _on_frame(self, frame):
+        now = time.time()
+        if not self._pad_to(now, reserve=1):
+            return False
+        self.last_frame = cv2.resize(frame, self.resolution)
+        return self._write(self.last_frame)
+
+    def _write(self, frame, padding=False):
+        # False once the writer has been finalized from outside. Counted under
+        # the lock so health() and a forced finalize() see consistent totals
+        with self.lock:
+            if self.writer is None:
+                return False
+            self.writer.write(frame)
+            if not padding:
+                self.frames_written += 1
+            elif self.frames_written:
+                self.frames_padded += 1
+            else:
+                self.frames_startup += 1
+            return True
+
+    def _frames_total(self):
+        return self.frames_written + self.frames_padded + self.frames_startup
+
+    def _pad_to(self, now, reserve=0):
+        """
+        Repeats the last frame until the video holds as many frames as
+        wall-clock time since the start calls for, minus `reserve` slots for
+        frames about to be written.
+        """
+        expected = int((now - self.t_start) * self.fps) - reserve
+        missing = expected - self._frames_total()
+        if missing > self.fps:
+            print(f"[Camera {self.cam_id}] Video is {missing / self.fps:.1f}s behind, "
+                  f"padding {missing} frames.")
+        for _ in range(max(0, missing)):
+            if not self._write(self.last_frame, padding=True):
+                return False
+        return True
+
+    def lost_frames(self, now=None):
+        """
+        Frames of footage lost since the first real frame, including an outage
+        still in progress: padding is only written once the source is back, so
+        the backlog behind wall-clock time is counted as it grows.
+        """
+        with self.lock:
+            if self.frames_written == 0 or self.writer is None:
+                return self.frames_padded
+            expected = int(((now or time.time()) - self.t_start) * self.fps) - 1
+            return self.frames_padded + max(0, expected - self._frames_total())
 
     def stop(self):
-        self.running.clear()
-
-    def cleanup(self):
-        if self.cap:
-            self.cap.release()
-        if self.writer:
-            self.writer.release()
+        if self.stop_time is None:
+            self.stop_time = time.time()
+        self.stop_event.set()
+
+    def finalize(self, state='stopped'):
+        """
+        Pads the video up to the moment stop was requested and closes the
+        file. Safe to call from any thread, the worker stops writing as soon
+        as the writer is gone.
+        """
+        with self.lock:
+            if self.finalized.is_set():
+                return
+            if self.writer:
+                # Cover a trailing outage, also when the worker is stuck and abandoned
+                self._pad_to(self.stop_time or time.time())
+                self.writer.release()
+                self.writer = None
+            self.supervisor.freeze(state)
+            self.finalized.set()
+
+    def health(self):
+        return {
+            'cam_id': self.cam_id,
+            'alive': self.is_alive(),
+            **self.supervisor.health(),
+            'frames_written': self.frames_written,
+            'frames_padded': self.frames_padded,
+            'frames_startup': self.frames_startup,
+            'frames_lost': self.lost_frames(),
+        }
 
 
 class CameraManager:
@@ -70,6 +249,8 @@ class CameraManager:
         self.recording_id = self._get_init_recording_id()
 
         self.threads = []
+        self.last_session = []  # threads of the last stopped session, reported until the next start
+        self.finalizing = []  # one Event per stopped session, set once its videos are closed
         self.target_fps = target_fps
         self.target_resolution = target_resolution  # (width, height)
 
@@ -100,33 +281,82 @@ class CameraManager:
             print("[Manager] No cameras to record.")
             return
 
+        # The previous session writes to its own folder, it can keep finalizing
+        # while this one connects
+        if not self.wait_stopped(0):
+            print(f"[Manager] Previous session still finalizing, starting session "
+                  f"{self.recording_id} alongside it.")
+
         session_path = self._prepare_recording_folder()
-        self.threads.clear()
+        self.threads = []
+        self.last_session = []
 
         for cam_id, cam_src in self.cameras.items():
             thread = CameraThread(cam_id, cam_src, session_path, self.target_fps, self.target_resolution)
             self.threads.append(thread)
 
+        # Threads connect in the background, see health() for their state
         for thread in self.threads:
             thread.start()
             print(f"[Manager] Camera {thread.cam_id} thread started.")
 
-        for thread in self.threads:
-            if not thread.running.wait(timeout=5):
-                print(f"[Manager] Camera {thread.cam_id} failed to start recording in time. Skipping.")
-
-
         print(f"[Manager] Recording session {self.recording_id} started.")
 
 
-    def stop_recording(self):
+    def stop_recording(self, deadline=STOP_DEADLINE):
+        """
+        Signals all camera threads to stop and returns immediately. A
+        background finalizer joins them and closes every video file within
+        `deadline` seconds, wait_stopped() blocks until it is done.
+        """
+        if not self.threads:
+            return
+
         print(f"[Manager] Stopping all camera threads.")
-        for thread in self.threads:
+        threads, self.threads = self.threads, []
+        self.last_session = threads
+        for thread in threads:
             thread.stop()
-            print(f"[Manager] Camera {thread.cam_id} thread stopped.")
-        print(f"[Manager] Recording session {self.recording_id} finished.")
+
+        done = threading.Event()
+        self.finalizing.append(done)
+        finalizer = threading.Thread(target=self._finalize_session,
+                                     args=(threads, self.recording_id, deadline, done))
+        finalizer.start()
         self.recording_id += 1
 
+    def _finalize_session(self, threads, recording_id, deadline, done):
+        end = time.monotonic() + deadline
+        for thread in threads:
+            thread.join(timeout=max(0, end - time.monotonic()))
+
+        for thread in threads:
+            if thread.is_alive():
+                # Stuck in a blocking read, close its file from here so the next session can start
+                thread.finalize('abandoned')
+                print(f"[Manager] Camera {thread.cam_id} did not stop within {deadline}s, "
+                      f"writer finalized and thread abandoned.")
+            else:
+                print(f"[Manager] Camera {thread.cam_id} thread stopped.")
+
+        print(f"[Manager] Recording session {recording_id} finished.")
+        done.set()
+
+    def wait_stopped(self, timeout=None):
+        """
+        Waits until every stopped session is finalized, False on timeout.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        for done in list(self.finalizing):
+            remaining = None if end is None else max(0, end - time.monotonic())
+            if not done.wait(remaining):
+                return False
+            self.finalizing.remove(done)
+        return True
+
+    def health(self):
+        return [thread.health() for thread in self.threads or self.last_session]
+
     def set_root_dir(self, new_root):
         self.root_dir = Path(new_root)
         print(f"[Manager] Root directory set to: {self.root_dir.resolve()}")
@@ -0,0 +1,206 @@
+import argparse
+import json
+import time
+
+import numcodecs
+import numpy as np
+import zarr
+from numcodecs.compat import ensure_ndarray
+
+import zarr_logger
+
+ZSTD_LEVELS = (1, 3, 5, 9)
+BLOSC_CNAMES = ('lz4', 'zstd')
+BLOSC_LEVELS = (1, 5, 9)
+BLOSC_SHUFFLES = {
+    'noshuffle': numcodecs.Blosc.NOSHUFFLE,
+    'shuffle': numcodecs.Blosc.SHUFFLE,
+    'bitshuffle': numcodecs.Blosc.BITSHUFFLE,
+}
+
+# What the writer used before codec configs existed
+BASELINE_SPEC = {'codec': 'zstd', 'level': 0, 'shuffle': 'noshuffle'}
+
+# Per-row time limits relative to BASELINE_SPEC. The recorder appends one
+# row per 50 ms tick, so encode has plenty of room, training reads whole
+# episodes, so decode should stay close to the baseline
+MAX_ENCODE_SLOWDOWN = 4.0
+MAX_DECODE_SLOWDOWN = 1.5
+TIMING_BYTES = 4_000_000   # sample tiled to at least this size, so per-call overhead does not dominate timing
+
+
+def candidate_specs(dtype):
+    # Only Zarr v3 spec codecs, see zarr_logger.zarr_codecs. Shuffled lz4 and
+    # zstd are covered by blosc
+    specs = [dict(BASELINE_SPEC)]
+    for level in ZSTD_LEVELS:
+        specs.append({'codec': 'zstd', 'level': level, 'shuffle': 'noshuffle'})
+    for cname in BLOSC_CNAMES:
+        for level in BLOSC_LEVELS:
+            for shuffle in BLOSC_SHUFFLES:
+                specs.append({'codec': 'blosc', 'cname': cname, 'level': level, 'shuffle': shuffle})
+    return specs
+
+
+def spec_name(spec):
+    name = spec['codec']
+    if spec['codec'] == 'blosc':
+        name += f"-{spec['cname']}"
+    if 'level' in spec:
+        name += f"-{spec['level']}"
+    if spec.get('shuffle', 'noshuffle') != 'noshuffle':
+        name += f"+{spec['shuffle']}"
+    return name
+
+
+def numcodecs_chain(spec, dtype):
+    """
+    Same pipeline as zarr_logger.zarr_codecs, built from plain numcodecs so
+    chunks can be encoded without going through a store.
+    """
+    if spec['codec'] == 'blosc':
+        return [numcodecs.Blosc(cname=spec['cname'], clevel=spec['level'],
+                                shuffle=BLOSC_SHUFFLES[spec.get('shuffle', 'noshuffle')])]
+    return [numcodecs.Zstd(level=spec['level'])]
+
+
+def encode(chain, buf):
+    for codec in chain:
+        buf = codec.encode(buf)
+    return buf
+
+
+def decode(chain, buf):
+    for codec in reversed(chain):
+        buf = codec.decode(buf)
+    return buf
+
+
+def profile_spec(spec, chunks, timing_buffer, repeats=3):
+    """
+    Ratio over the store's chunks, per-row encode/decode time over one large
+    timing_buffer so the numbers reflect the codec rather than call overhead.
+    """
+    dtype = chunks[0].dtype
+    chain = numcodecs_chain(spec, dtype)
+
+    encoded = [encode(chain, chunk) for chunk in chunks]
+    for chunk, buf in zip(chunks, encoded):
+        restored = ensure_ndarray(decode(chain, buf)).view(dtype).reshape(chunk.shape)
+        if not np.array_equal(restored, chunk):
+            raise ValueError(f"{spec_name(spec)} does not round-trip {dtype} data.")
+    raw_bytes = sum(chunk.nbytes for chunk in chunks)
+    compressed_bytes = sum(ensure_ndarray(buf).nbytes for buf in encoded)
+
+    encode_time = decode_time = float('inf')
+    for _ in range(repeats):
+        t = time.perf_counter()
+        buf = encode(chain, timing_buffer)
+        encode_time = min(encode_time, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        decode(chain, buf)
+        decode_time = min(decode_time, time.perf_counter() - t)
+
+    rows = len(timing_buffer)
+    return {
+        'spec': spec,
+        'ratio': raw_bytes / compressed_bytes,
+        'encode_us_per_row': encode_time / rows * 1e6,
+        'decode_us_per_row': decode_time / rows * 1e6,
+    }
+
+
+def pick_spec(results, max_encode_slowdown=MAX_ENCODE_SLOWDOWN, max_decode_slowdown=MAX_DECODE_SLOWDOWN):
+    """
+    Highest ratio within the per-row time limits relative to BASELINE_SPEC.
+    Specs that compress worse than the baseline are never picked, the
+    baseline itself always qualifies.
+    """
+    baseline = next(r for r in results if r['spec'] == BASELINE_SPEC)
+    eligible = [r for r in results
+                if r['ratio'] >= baseline['ratio']
+                and r['encode_us_per_row'] <= baseline['encode_us_per_row'] * max_encode_slowdown
+                and r['decode_us_per_row'] <= baseline['decode_us_per_row'] * max_decode_slowdown]
+    return max([baseline] + eligible, key=lambda r: (r['ratio'], -r['decode_us_per_row']))
+
+
+def sample_arrays(root, n_episodes):
+    """
+    Reads n_episodes evenly spaced non-empty episodes, returns {name: array}
+    with the rows of all sampled episodes concatenated.
+    """
+    starts, episode_ends = zarr_logger.episode_bounds(root['meta/episode_ends'][:])
+    non_empty = np.flatnonzero(episode_ends > starts)
+    if len(non_empty) == 0:
+        raise ValueError("Replay buffer has no recorded episodes.")
+
+    picked = non_empty[np.unique(np.linspace(0, len(non_empty) - 1, n_episodes).astype(int))]
+    data = root['data']
+    sample = {
+        name: np.concatenate([data[name][starts[i]:episode_ends[i]] for i in picked])
+        for name in data.keys()
+    }
+    sample['episode_ends'] = episode_ends
+    return sample, picked
+
+
+def split_chunks(array, chunk_rows=zarr_logger.CHUNK_ROWS):
+    return [np.ascontiguousarray(array[i:i + chunk_rows]) for i in range(0, len(array), chunk_rows)]
+
+
+def timing_buffer(array, min_bytes=TIMING_BYTES):
+    reps = -(-min_bytes // max(array.nbytes, 1))
+    return np.ascontiguousarray(np.concatenate([array] * max(reps, 1)))
+
+
+def profile_replay_buffer(zarr_path=zarr_logger.ZARR_PATH, n_episodes=5, repeats=3,
+                          max_encode_slowdown=MAX_ENCODE_SLOWDOWN, max_decode_slowdown=MAX_DECODE_SLOWDOWN):
+    root = zarr.open(zarr_path, mode='r')
+    sample, picked = sample_arrays(root, n_episodes)
+    print(f"[Profile] Sampled episodes {picked.tolist()} from {zarr_path}.")
+
+    recommended = {}
+    profile = {}
+    for name, array in sample.items():
+        chunks = split_chunks(array)
+        buffer = timing_buffer(array)
+        results = [profile_spec(spec, chunks, buffer, repeats) for spec in candidate_specs(array.dtype)]
+        best = pick_spec(results, max_encode_slowdown, max_decode_slowdown)
+
+        recommended[name] = best['spec']
+        profile[name] = results
+
+        baseline = next(r for r in results if r['spec'] == BASELINE_SPEC)
+        print(f"[Profile] {name} ({array.dtype}, {array.nbytes / 1e6:.2f} MB): "
+              f"{spec_name(best['spec'])} ratio {best['ratio']:.2f}, "
+              f"enc {best['encode_us_per_row']:.3f} us/row, dec {best['decode_us_per_row']:.3f} us/row "
+              f"(baseline ratio {baseline['ratio']:.2f}, enc {baseline['encode_us_per_row']:.3f}, "
+              f"dec {baseline['decode_us_per_row']:.3f})")
+
+    return {
+        'source': str(zarr_path),
+        'episodes': picked.tolist(),
+        'arrays': recommended,
+        'profile': profile,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Profile codec chains on a replay buffer sample "
+                                                 "and write a per-array codec config.")
+    parser.add_argument('zarr_path', nargs='?', default=zarr_logger.ZARR_PATH)
+    parser.add_argument('-o', '--output', default=zarr_logger.CODEC_CONFIG_PATH)
+    parser.add_argument('--episodes', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-encode-slowdown', type=float, default=MAX_ENCODE_SLOWDOWN,
+                        help="per-row encode time limit relative to the baseline codec")
+    parser.add_argument('--max-decode-slowdown', type=float, default=MAX_DECODE_SLOWDOWN,
+                        help="per-row decode time limit relative to the baseline codec")
+    args = parser.parse_args()
+
+    config = profile_replay_buffer(args.zarr_path, args.episodes, args.repeats,
+                                   args.max_encode_slowdown, args.max_decode_slowdown)
+    with open(args.output, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"[Profile] Codec config written to {args.output}.")
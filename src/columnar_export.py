@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import zarr
+
+import zarr_logger
+
+EXPORT_ROWS = zarr_logger.CHUNK_ROWS * 100   # rows per Parquet row group / HDF5 append
+MANIFEST_NAME = "_manifest.json"
+EPISODE_ENDS_KEY = 'episode_ends'        # manifest key, source episode_ends at export time
+EXPORTED_ENDS_PATH = 'meta/episode_ends'  # same for HDF5, kept as a dataset
+
+
+def iter_chunks(data, names, starts, episode_ends, first_episode, last_episode,
+                chunk_rows=EXPORT_ROWS):
+    """
+    Yields {column: array} for episodes [first_episode, last_episode), at most
+    chunk_rows rows at a time, with `episode` and `step` columns prepended.
+    """
+    row_start = int(starts[first_episode])
+    row_stop = int(episode_ends[last_episode - 1])
+
+    for chunk_start in range(row_start, row_stop, chunk_rows):
+        chunk_stop = min(chunk_start + chunk_rows, row_stop)
+        rows = np.arange(chunk_start, chunk_stop, dtype=np.int64)
+        episode = np.searchsorted(episode_ends, rows, side='right')
+
+        columns = {'episode': episode, 'step': rows - starts[episode]}
+        for name in names:
+            columns[name] = data[name][chunk_start:chunk_stop]
+        yield columns
+
+
+def split_episodes(starts, episode_ends, first_episode, n_episodes, n_parts):
+    """
+    Splits [first_episode, n_episodes) into at most n_parts contiguous ranges
+    holding roughly the same number of rows.
+    """
+    if first_episode >= n_episodes:
+        return []
+    row_start = starts[first_episode]
+    row_stop = episode_ends[n_episodes - 1]
+    targets = np.linspace(row_start, row_stop, n_parts + 1)[1:-1]
+    # Cut right after the episode that crosses each target row
+    cuts = np.searchsorted(episode_ends[first_episode:n_episodes], targets) + first_episode + 1
+    cuts = np.clip(cuts, first_episode, n_episodes)
+    bounds = np.unique(np.concatenate(([first_episode], cuts, [n_episodes])))
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def parquet_table(columns):
+    import pyarrow as pa
+
+    # Wide (n, 6) telemetry is split into one scalar column per component
+    flat = {}
+    for name, values in columns.items():
+        if values.ndim == 1:
+            flat[name] = values
+        else:
+            for i in range(values.shape[1]):
+                flat[f"{name}_{i}"] = values[:, i]
+    return pa.table(flat)
+
+
+def write_parquet_part(zarr_path, out_dir, first_episode, last_episode, chunk_rows, compression):
+    import pyarrow.parquet as pq
+
+    root = zarr.open(zarr_path, mode='r')
+    data = root['data']
+    starts, episode_ends = zarr_logger.episode_bounds(root['meta/episode_ends'][:])
+
+    file_name = f"part-{first_episode:06d}-{last_episode - 1:06d}.parquet"
+    tmp_path = out_dir / (file_name + ".tmp")
+    writer = None
+    try:
+        for columns in iter_chunks(data, list(data.keys()), starts, episode_ends,
+                                   first_episode, last_episode, chunk_rows):
+            table = parquet_table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression=compression)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        # Only empty episodes in this range
+        return None
+    os.replace(tmp_path, out_dir / file_name)
+    return file_name
+
+def source_id(zarr_path):
+    return os.path.abspath(zarr_path)
+
+
+def resume_point(exported_source, exported_ends, zarr_path, episode_ends):
+    """
+    Number of episodes a previous export already holds, or None when it came
+    from another store or the source episodes were rewritten since.
+    """
+    exported_ends = np.asarray(exported_ends, dtype=np.int64)
+    n = len(exported_ends)
+    if n == 0:
+        return 0
+    if exported_source != source_id(zarr_path):
+        return None
+    if n > len(episode_ends) or not np.array_equal(episode_ends[:n], exported_ends):
+        return None
+    return n
+
+
+def mismatch_error(out_path, exported_source, zarr_path):
+    return ValueError(f"{out_path} was exported from {exported_source} and does not match the "
+                      f"episodes of {source_id(zarr_path)}, pass restart=True to export from scratch.")
+
+
+def read_manifest(out_dir):
+    manifest_path = out_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {'source': None, EPISODE_ENDS_KEY: [], 'files': []}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def write_manifest(out_dir, manifest):
+    tmp_path = out_dir / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, out_dir / MANIFEST_NAME)
+
+
+def export_parquet(zarr_path, out_dir, workers=4, chunk_rows=EXPORT_ROWS, compression='zstd',
+                   restart=False):
+    """
+    Exports finished episodes into a directory of Parquet files, one row group
+    per chunk_rows rows. Episodes listed in the manifest from a previous run are
+    skipped, new ones are split across `workers` files written in parallel.
+    Resuming requires the same source store with the already exported
+    episodes unchanged, otherwise this raises unless restart is set.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(out_dir)
+
+    root = zarr.open(zarr_path, mode='r')
+    starts, episode_ends = zarr_logger.episode_bounds(root['meta/episode_ends'][:])
+
+    first_episode = resume_point(manifest['source'], manifest[EPISODE_ENDS_KEY], zarr_path, episode_ends)
+    if first_episode is None:
+        if not restart:
+            raise mismatch_error(out_dir, manifest['source'], zarr_path)
+        print(f"[Export] Source changed, re-exporting {out_dir} from scratch.")
+        manifest = {'source': None, EPISODE_ENDS_KEY: [], 'files': []}
+        first_episode = 0
+
+    # Leftovers of an interrupted run are not in the manifest and get rewritten
+    for path in out_dir.glob("part-*.parquet*"):
+        if path.name not in manifest['files']:
+            path.unlink()
+
+    parts = split_episodes(starts, episode_ends, first_episode, len(episode_ends), workers)
+    if not parts:
+        print(f"[Export] {out_dir} is up to date ({first_episode} episodes).")
+        return manifest
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        files = list(pool.map(
+            lambda part: write_parquet_part(zarr_path, out_dir, *part, chunk_rows, compression),
+            parts))
+
+    manifest = {
+        'source': source_id(zarr_path),
+        EPISODE_ENDS_KEY: episode_ends.tolist(),
+        'files': manifest['files'] + [f for f in files if f is not None],
+    }
+    write_manifest(out_dir, manifest)
+    print(f"[Export] Wrote episodes {first_episode}..{len(episode_ends) - 1} to {out_dir}.")
+    return manifest
+
+
+def export_hdf5(zarr_path, out_path, chunk_rows=EXPORT_ROWS, compression='gzip', restart=False):
+    """
+    Appends finished episodes to resizable HDF5 datasets, one dataset per
+    array plus `episode` and `step`. HDF5 has a single writer, so this runs
+    sequentially. The exported `episode_ends` are kept under `meta/` and the
+    source path as a file attribute, resuming follows the same rules as
+    export_parquet.
+    """
+    import h5py
+
+    root = zarr.open(zarr_path, mode='r')
+    data = root['data']
+    names = list(data.keys())
+    starts, episode_ends = zarr_logger.episode_bounds(root['meta/episode_ends'][:])
+
+    with h5py.File(out_path, 'a') as f:
+        exported_source = f.attrs.get('source')
+        exported_ends = f[EXPORTED_ENDS_PATH][:] if EXPORTED_ENDS_PATH in f else []
+        first_episode = resume_point(exported_source, exported_ends, zarr_path, episode_ends)
+        if first_episode is None:
+            if not restart:
+                raise mismatch_error(out_path, exported_source, zarr_path)
+            print(f"[Export] Source changed, re-exporting {out_path} from scratch.")
+            for name in list(f.keys()):
+                del f[name]
+            first_episode = 0
+
+        if first_episode >= len(episode_ends):
+            print(f"[Export] {out_path} is up to date ({first_episode} episodes).")
+            return first_episode
+
+        # Drop rows of an interrupted run, everything past the recorded episodes is rewritten
+        exported_rows = int(episode_ends[first_episode - 1]) if first_episode else 0
+        for name in f.keys():
+            if name != 'meta':
+                f[name].resize(exported_rows, axis=0)
+
+        for columns in iter_chunks(data, names, starts, episode_ends,
+                                   first_episode, len(episode_ends), chunk_rows):
+            for name, values in columns.items():
+                if name not in f:
+                    f.create_dataset(name, shape=(0,) + values.shape[1:],
+                                     maxshape=(None,) + values.shape[1:],
+                                     dtype=values.dtype, chunks=True, compression=compression)
+                dataset = f[name]
+                n = dataset.shape[0]
+                dataset.resize(n + len(values), axis=0)
+                dataset[n:] = values
+
+        # Only updated once all rows are in
+        if EXPORTED_ENDS_PATH in f:
+            del f[EXPORTED_ENDS_PATH]
+        f.create_dataset(EXPORTED_ENDS_PATH, data=episode_ends)
+        f.attrs['source'] = source_id(zarr_path)
+
+    print(f"[Export] Wrote episodes {first_episode}..{len(episode_ends) - 1} to {out_path}.")
+    return len(episode_ends)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export replay buffer episodes to Parquet or HDF5.")
+    parser.add_argument('format', choices=['parquet', 'hdf5'])
+    parser.add_argument('output', help="directory for parquet, file for hdf5")
+    parser.add_argument('--zarr-path', default=zarr_logger.ZARR_PATH)
+    parser.add_argument('--workers', type=int, default=4, help="parquet only")
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_ROWS)
+    parser.add_argument('--restart', action='store_true',
+                        help="export from scratch if the output came from another or rewritten store")
+    args = parser.parse_args()
+
+    if args.format == 'parquet':
+        export_parquet(args.zarr_path, args.output, workers=args.workers, chunk_rows=args.chunk_rows,
+                       restart=args.restart)
+    else:
+        export_hdf5(args.zarr_path, args.output, chunk_rows=args.chunk_rows, restart=args.restart)
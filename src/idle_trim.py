@@ -0,0 +1,276 @@
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import zarr
+
+import zarr_logger
+
+LIN_VEL_THRESHOLD = 1e-3     # m/s, TCP linear speed below which the arm counts as still
+ANG_VEL_THRESHOLD = 1e-2     # rad/s, TCP angular speed below which the arm counts as still
+ACTION_THRESHOLD = 1e-5      # m (rad for rotation), per-tick change of the commanded pose
+MIN_IDLE_STEPS = 20          # mid-episode idle runs shorter than this are kept (1 s at 20 Hz)
+
+CONTROL_PERIOD = 0.05        # s, ControllerTeleop.loop target_time
+VIDEO_FPS = 30               # CameraManager target_fps
+RECORDINGS_DIR = "recordings"  # CameraManager root_dir
+
+SEGMENT_COLUMNS = ['episode', 'source_episode', 'recording',
+                   'step_start', 'step_end', 'frame_start', 'frame_end']
+
+
+def idle_mask(eef_vel, action, stage,
+              lin_vel_threshold=LIN_VEL_THRESHOLD,
+              ang_vel_threshold=ANG_VEL_THRESHOLD,
+              action_threshold=ACTION_THRESHOLD):
+    """
+    Per-step idle flags for one episode.
+
+    A step is idle when the measured TCP speed is below threshold, the commanded
+    pose did not move since the previous tick and the stage did not change.
+    """
+    eef_vel = np.asarray(eef_vel, dtype=np.float32)
+    action = np.asarray(action, dtype=np.float32)
+    stage = np.asarray(stage)
+
+    lin_speed = np.linalg.norm(eef_vel[:, :3], axis=1)
+    ang_speed = np.linalg.norm(eef_vel[:, 3:], axis=1)
+
+    # First step is compared with itself so it only depends on the measured speed
+    action_delta = np.diff(action, axis=0, prepend=action[:1])
+    lin_delta = np.linalg.norm(action_delta[:, :3], axis=1)
+    ang_delta = np.linalg.norm(action_delta[:, 3:], axis=1)
+
+    stage_changed = np.diff(stage, prepend=stage[:1]) != 0
+
+    return ((lin_speed < lin_vel_threshold)
+            & (ang_speed < ang_vel_threshold)
+            & (lin_delta < action_threshold)
+            & (ang_delta < action_threshold)
+            & ~stage_changed)
+
+
+def runs(mask):
+    """
+    Returns (starts, ends) of the True runs in a boolean mask, ends exclusive.
+    """
+    padded = np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0]))
+    edges = np.diff(padded)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def keep_mask(idle, min_idle_steps=MIN_IDLE_STEPS):
+    """
+    Steps to keep after trimming. Idle runs touching either end of the episode
+    are always dropped, interior ones only if they last at least min_idle_steps.
+    """
+    n = len(idle)
+    starts, ends = runs(idle)
+    drop = (starts == 0) | (ends == n) | (ends - starts >= min_idle_steps)
+
+    # Runs never touch each other, so +1/-1 at the run edges and a cumsum
+    # paints every dropped step without a Python loop
+    delta = np.zeros(n + 1, dtype=np.int32)
+    delta[starts[drop]] += 1
+    delta[ends[drop]] -= 1
+    return np.cumsum(delta[:-1]) == 0
+
+
+def step_times(timestamp, control_period=CONTROL_PERIOD):
+    """
+    Seconds since the first step of the episode for every step.
+
+    Stores from before float timestamps hold whole seconds. There the nominal
+    control rate is used, shifted forward whenever it falls more than a second
+    behind the stored clock (pauses, dropped ticks) and held back when it runs
+    more than a second ahead, so gaps are accounted for to within a second.
+    """
+    timestamp = np.asarray(timestamp)
+    if np.issubdtype(timestamp.dtype, np.floating):
+        return timestamp - timestamp[0]
+
+    nominal = np.arange(len(timestamp)) * control_period
+    coarse = (timestamp - timestamp[0]).astype(np.float64)
+    behind = np.maximum.accumulate(np.maximum(coarse - 1 - nominal, 0))
+    return np.minimum(nominal + behind, coarse + 1)
+
+
+def steps_to_frames(times, steps, fps=VIDEO_FPS, control_period=CONTROL_PERIOD):
+    """
+    Video frame of every step in steps, times from step_times(). The video
+    starts with the episode and is padded to wall-clock time by CameraThread.
+    """
+    # An exclusive end step is one control period after the last step
+    times = np.append(times, times[-1] + control_period)
+    return np.rint(times[np.asarray(steps)] * fps).astype(np.int64)
+
+
+def episode_recordings(src, starts, ends, recordings_dir=RECORDINGS_DIR, allow_unknown=False):
+    """
+    recordings/<id>/ folder of every source episode, NO_RECORDING for none.
+
+    Taken from `meta/episode_recording`. Stores recorded before that array
+    existed only get ids when their non-empty episodes match the folders in
+    recordings_dir one to one. Non-empty episodes whose recording is unknown
+    or missing on disk raise, unless allow_unknown is set.
+    """
+    n_episodes = len(ends)
+    non_empty = ends > starts
+    folders = []
+    if os.path.isdir(recordings_dir):
+        folders = sorted(int(d.name) for d in Path(recordings_dir).iterdir()
+                         if d.is_dir() and d.name.isdigit())
+
+    recordings = np.full(n_episodes, zarr_logger.NO_RECORDING, dtype=np.int64)
+    if 'episode_recording' in src['meta']:
+        recordings[:] = src['meta/episode_recording'][:n_episodes]
+    if (recordings[non_empty] == zarr_logger.NO_RECORDING).all() and non_empty.sum() == len(folders):
+        recordings[non_empty] = folders
+
+    unknown = non_empty & ~np.isin(recordings, folders)
+    if unknown.any():
+        message = (f"{unknown.sum()} non-empty episode(s) have no matching folder in {recordings_dir}/ "
+                   f"(episodes {np.flatnonzero(unknown).tolist()}).")
+        if not allow_unknown:
+            raise ValueError(message + " Pass allow_unknown_recordings=True to write them as "
+                                       f"recording {zarr_logger.NO_RECORDING}.")
+        print(f"[Trim] Warning: {message}")
+        recordings[unknown] = zarr_logger.NO_RECORDING
+    return recordings
+
+
+def trim_replay_buffer(src_path, dst_path,
+                       min_idle_steps=MIN_IDLE_STEPS,
+                       fps=VIDEO_FPS,
+                       control_period=CONTROL_PERIOD,
+                       recordings_dir=RECORDINGS_DIR,
+                       allow_unknown_recordings=False,
+                       overwrite=False,
+                       codec_config=None,
+                       **thresholds):
+    """
+    Copies src_path to dst_path without idle spans, one episode at a time.
+
+    Every array of an episode is read exactly once, so memory is bounded by the
+    longest episode. Episodes that are empty or entirely idle are dropped.
+    `meta/episode_ends` is rebuilt for the trimmed data and `meta/trim_segments`
+    records, for every kept span, the source step range and the matching frame
+    range in the episode video (frames relative to the start of the episode,
+    mapped through `timestamp`, see step_times()).
+
+    The `recording` column names the `recordings/<recording>/` folder holding
+    the videos, see episode_recordings().
+    codec_config is passed to the writer, see codec_profile.py.
+    """
+    if os.path.exists(dst_path) and not overwrite:
+        raise FileExistsError(f"{dst_path} already exists, pass overwrite=True to replace it.")
+
+    src = zarr.open(src_path, mode='r')
+    src_data = src['data']
+    names = list(src_data.keys())
+
+    data_specs = {
+        name: ((0,) + src_data[name].shape[1:], str(src_data[name].dtype))
+        for name in names
+    }
+    writer = zarr_logger.RealTimeZarrWriter(dst_path, data_specs, overwrite=overwrite,
+                                            codec_config=codec_config)
+
+    segments = []
+    kept_steps = 0
+    total_steps = 0
+    out_episode = 0
+    starts, ends = zarr_logger.episode_bounds(src['meta/episode_ends'][:])
+    recordings = episode_recordings(src, starts, ends, recordings_dir, allow_unknown_recordings)
+    if not np.issubdtype(src_data['timestamp'].dtype, np.floating):
+        print(f"[Trim] Warning: {src_path} has whole-second timestamps, "
+              f"frame ranges are only accurate to about a second.")
+
+    for src_episode, (start, end) in enumerate(zip(starts, ends)):
+        total_steps += end - start
+        if end <= start:
+            continue
+        recording = recordings[src_episode]
+
+        episode = {name: src_data[name][start:end] for name in names}
+        idle = idle_mask(episode['robot_eef_pose_vel'], episode['action'], episode['stage'],
+                         **thresholds)
+        keep = keep_mask(idle, min_idle_steps)
+        times = step_times(episode['timestamp'], control_period)
+
+        n_keep = int(keep.sum())
+        if n_keep == 0:
+            print(f"[Trim] Episode {src_episode} is idle throughout. Skipping.")
+            continue
+
+        writer.append_data({name: episode[name][keep] for name in names})
+        writer.end_episode(recording)
+
+        seg_starts, seg_ends = runs(keep)
+        segments.append(np.stack([
+            np.full(len(seg_starts), out_episode),
+            np.full(len(seg_starts), src_episode),
+            np.full(len(seg_starts), recording),
+            seg_starts,
+            seg_ends,
+            steps_to_frames(times, seg_starts, fps, control_period),
+            steps_to_frames(times, seg_ends, fps, control_period),
+        ], axis=1))
+
+        print(f"[Trim] Episode {src_episode} (recording {recording}): kept {n_keep}/{end - start} steps "
+              f"in {len(seg_starts)} segment(s).")
+        kept_steps += n_keep
+        out_episode += 1
+
+    if segments:
+        segments = np.concatenate(segments)
+    else:
+        segments = np.zeros((0, len(SEGMENT_COLUMNS)), dtype=np.int64)
+    segments_array = writer.meta_group.create_array(
+        'trim_segments', shape=(0, len(SEGMENT_COLUMNS)),
+        chunks=(100, len(SEGMENT_COLUMNS)), dtype='i8')
+    if len(segments):
+        segments_array.append(segments)
+    segments_array.attrs.update({
+        'columns': SEGMENT_COLUMNS,
+        'fps': fps,
+        'control_period': control_period,
+        'min_idle_steps': min_idle_steps,
+    })
+
+    print(f"[Trim] Wrote {out_episode} episode(s), {kept_steps}/{total_steps} steps to {dst_path}.")
+    return segments
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Trim idle spans from a replay buffer.")
+    parser.add_argument('src', nargs='?', default=zarr_logger.ZARR_PATH)
+    parser.add_argument('dst', nargs='?', default="trimmed_replay_buffer.zarr")
+    parser.add_argument('--min-idle-steps', type=int, default=MIN_IDLE_STEPS)
+    parser.add_argument('--fps', type=float, default=VIDEO_FPS)
+    parser.add_argument('--control-period', type=float, default=CONTROL_PERIOD)
+    parser.add_argument('--recordings-dir', default=RECORDINGS_DIR)
+    parser.add_argument('--allow-unknown-recordings', action='store_true',
+                        help=f"write episodes without a video folder as recording {zarr_logger.NO_RECORDING}")
+    parser.add_argument('--lin-vel-threshold', type=float, default=LIN_VEL_THRESHOLD)
+    parser.add_argument('--ang-vel-threshold', type=float, default=ANG_VEL_THRESHOLD)
+    parser.add_argument('--action-threshold', type=float, default=ACTION_THRESHOLD)
+    parser.add_argument('--codec-config', default=None,
+                        help="JSON written by codec_profile.py")
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+
+    trim_replay_buffer(
+        args.src, args.dst,
+        min_idle_steps=args.min_idle_steps,
+        fps=args.fps,
+        control_period=args.control_period,
+        recordings_dir=args.recordings_dir,
+        allow_unknown_recordings=args.allow_unknown_recordings,
+        overwrite=args.overwrite,
+        codec_config=args.codec_config,
+        lin_vel_threshold=args.lin_vel_threshold,
+        ang_vel_threshold=args.ang_vel_threshold,
+        action_threshold=args.action_threshold,
+    )
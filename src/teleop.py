@@ -1,4 +1,7 @@
 import numpy as np
+import json
+import os
+import socket
 import time
 
 import rtde_control
@@ -8,9 +11,11 @@ import controller
 import zarr_logger
 import camera
 
+STATUS_ADDR = ('127.0.0.1', 5560)  # cams_preview.py listens here for the overlay
+
 
 class ControllerTeleop:
-    def __init__(self, IP):
+    def __init__(self, IP, codecConfig=zarr_logger.CODEC_CONFIG_PATH):
         print('Connecting to robot at', IP)
         self.rtde_c = rtde_control.RTDEControlInterface(IP)
         self.rtde_r = rtde_receive.RTDEReceiveInterface(IP)
@@ -22,7 +27,11 @@ class ControllerTeleop:
         self.controller.start()
 
         self.epTick = 0
-        self.zarrWriter = zarr_logger.RealTimeZarrWriter(overwrite=False)
+        # Codecs only apply to arrays created now, an existing store keeps its own
+        if codecConfig and not os.path.exists(codecConfig):
+            print('No codec config at', codecConfig, '- using zarr defaults')
+            codecConfig = None
+        self.zarrWriter = zarr_logger.RealTimeZarrWriter(overwrite=False, codec_config=codecConfig)
 
         self.stageBtnFlag = False
         self.telemetryStage = 0
@@ -31,6 +40,10 @@ class ControllerTeleop:
             'recordings', target_fps=30, target_resolution=(640, 480))
         self.recording_running = False
 
+        self.cycleOverruns = 0
+        self.statusSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.statusSocket.setblocking(False)
+
         print('init finished')
 
     def stop(self):
@@ -40,11 +53,29 @@ class ControllerTeleop:
         self.rtde_r.disconnect()
         self.controller.stop()
         self.cameraManager.stop_recording()
+        self.cameraManager.wait_stopped(camera.STOP_DEADLINE)
+        self.statusSocket.close()
 
     def statusLine(self):
         print(f"Stage: {self.telemetryStage}, Velocity: {
               self.velocityMultiplier:.4f}, Tick: {self.epTick:6d} ", end='\r')
 
+    def publishStatus(self):
+        cameras = self.cameraManager.health()
+        status = {
+            'stage': self.telemetryStage,
+            'velocity': self.velocityMultiplier,
+            'tick': self.epTick,
+            'overruns': self.cycleOverruns,
+            'recording': self.recording_running,
+            'lost': sum(c['frames_lost'] for c in cameras),
+            'reconnects': sum(c['reconnects'] for c in cameras),
+        }
+        try:
+            self.statusSocket.sendto(json.dumps(status).encode(), STATUS_ADDR)
+        except OSError:
+            pass  # Nobody listening or buffer full, the preview just misses a tick
+
     def handleBtns(self):
         if not self.controller.btnState()[0]:
             self.stageBtnFlag = False
@@ -67,7 +98,9 @@ class ControllerTeleop:
                 self.endEpFlag = True
                 self.telemetryStage = 0
                 self.epTick = 0
-                self.zarrWriter.end_episode()
+                # Only an episode ending while the cameras run has videos
+                self.zarrWriter.end_episode(
+                    self.cameraManager.recording_id if self.recording_running else zarr_logger.NO_RECORDING)
 
                 if self.recording_running:
                     self.cameraManager.stop_recording()
@@ -99,6 +132,7 @@ class ControllerTeleop:
             self.handleTelemetry()
 
             self.statusLine()
+            self.publishStatus()
 
             left_stick = self.controller.leftStickPos()
             sp = np.zeros(6)
@@ -110,6 +144,7 @@ class ControllerTeleop:
             dt = time.time() - dt
             if dt > target_time:
                 print("WARN cycle time too high")
+                self.cycleOverruns += 1
             else:
                 sleep_time = max(0, target_time - dt)
                 time.sleep(sleep_time)
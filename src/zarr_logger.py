@@ -1,5 +1,6 @@
 import zarr
 import numpy as np
+import json
 import os
 import shutil
 import time
@@ -11,14 +12,68 @@ DATA_ARRAY_SPECS = {
     'robot_joint': ((0, 6), 'float32'),         # getActualQ
     'robot_joint_vel': ((0, 6), 'float32'),     # getActualQd
     'stage': ((0,), 'int8'),
-    'timestamp': ((0,), 'int64')
+    'timestamp': ((0,), 'float64')              # time.time(), s
 }
 
 ZARR_PATH = "new_replay_buffer.zarr"
+CHUNK_ROWS = 100
+CODEC_CONFIG_PATH = "codec_config.json"   # written by codec_profile.py
+NO_RECORDING = -1                         # episode_recording entry of an episode without videos
+
+
+def episode_bounds(episode_ends):
+    """
+    Returns (starts, ends) row ranges of every episode from `meta/episode_ends`.
+    """
+    episode_ends = np.asarray(episode_ends, dtype=np.int64)
+    starts = np.concatenate(([0], episode_ends[:-1]))
+    return starts, episode_ends
+
+
+def load_codec_config(codec_config):
+    """
+    Accepts a path to a JSON file written by codec_profile.py or an already
+    loaded dict, returns {array_name: codec_spec}.
+    """
+    if codec_config is None:
+        return {}
+    if not isinstance(codec_config, dict):
+        with open(codec_config) as f:
+            codec_config = json.load(f)
+    return codec_config.get('arrays', codec_config)
+
+
+def zarr_codecs(spec, dtype):
+    """
+    Translates a codec spec into `create_array` keyword arguments.
+
+    Spec keys: codec ('zstd' | 'blosc'), level, cname ('lz4' | 'zstd') and
+    shuffle ('noshuffle' | 'shuffle' | 'bitshuffle', blosc only). Only codecs
+    of the Zarr v3 spec are used, so the store stays readable outside of
+    numcodecs; specs that need anything else are rejected.
+    """
+    shuffle = spec.get('shuffle', 'noshuffle')
+    if spec.get('delta'):
+        raise ValueError("Delta is not a Zarr v3 spec codec, re-run codec_profile.py.")
+
+    if spec['codec'] == 'blosc':
+        compressor = zarr.codecs.BloscCodec(
+            cname=spec.get('cname', 'lz4'), clevel=spec.get('level', 5),
+            shuffle=shuffle, typesize=np.dtype(dtype).itemsize)
+    elif spec['codec'] == 'zstd':
+        if shuffle != 'noshuffle':
+            raise ValueError(f"Shuffle '{shuffle}' is only supported with blosc.")
+        compressor = zarr.codecs.ZstdCodec(level=spec.get('level', 0))
+    else:
+        raise ValueError(f"Codec '{spec['codec']}' is not a Zarr v3 spec codec, re-run codec_profile.py.")
+
+    return {'compressors': [compressor]}
+
 
 class RealTimeZarrWriter:
-    def __init__(self, zarr_path=ZARR_PATH, data_specs=DATA_ARRAY_SPECS, overwrite=False):
+    def __init__(self, zarr_path=ZARR_PATH, data_specs=DATA_ARRAY_SPECS, overwrite=False, codec_config=None):
         self.zarr_path = zarr_path
+        self.codec_config = load_codec_config(codec_config)
 
         if overwrite and os.path.exists(zarr_path):
             shutil.rmtree(zarr_path)
@@ -32,12 +87,30 @@ class RealTimeZarrWriter:
         # Create data arrays based on the provided specifications
         for name, (shape, dtype) in data_specs.items():
             if name not in self.data_group:
-                chunks = (100,) + shape[1:] if len(shape) > 1 else (100,)
-                self.data_group.create_array(name, shape=shape, chunks=chunks, dtype=dtype)
+                chunks = (CHUNK_ROWS,) + shape[1:] if len(shape) > 1 else (CHUNK_ROWS,)
+                self.data_group.create_array(name, shape=shape, chunks=chunks, dtype=dtype,
+                                             **self._codecs(name, dtype))
 
         # Create metadata arrays
         if 'episode_ends' not in self.meta_group:
-            self.meta_group.create_array('episode_ends', shape=(0,), chunks=(100,), dtype='i8')
+            self.meta_group.create_array('episode_ends', shape=(0,), chunks=(CHUNK_ROWS,), dtype='i8',
+                                         **self._codecs('episode_ends', 'i8'))
+
+        # recordings/<id>/ folder of every episode, stores from before it existed get NO_RECORDING
+        if 'episode_recording' not in self.meta_group:
+            self.meta_group.create_array('episode_recording', shape=(0,), chunks=(CHUNK_ROWS,), dtype='i8',
+                                         **self._codecs('episode_recording', 'i8'))
+            n_episodes = self.meta_group['episode_ends'].shape[0]
+            if n_episodes:
+                self.meta_group['episode_recording'].append(np.full(n_episodes, NO_RECORDING))
+
+
+    def _codecs(self, name, dtype):
+        # Arrays missing from the config keep the zarr defaults
+        spec = self.codec_config.get(name)
+        if spec is None:
+            return {}
+        return zarr_codecs(spec, dtype)
 
 
     def append_data(self, timestep_data):
@@ -51,13 +124,15 @@ class RealTimeZarrWriter:
                 print(f"Warning: Array '{name}' not found in data specifications.")
 
 
-    def end_episode(self):
+    def end_episode(self, recording_id=NO_RECORDING):
         """
-        Marks the end of an episode by recording the current number of data points.
+        Marks the end of an episode by recording the current number of data points
+        and the camera recording the episode was filmed in.
         """
         # Use the 'action' array's length as the reference for the total number of timesteps
         current_len = self.data_group['action'].shape[0]
         self.meta_group['episode_ends'].append([current_len])
+        self.meta_group['episode_recording'].append([recording_id])
 
 
 